@@ -1,18 +1,46 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
 import yaml
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from filelock import FileLock
 from pydantic import BaseModel
 from datetime import datetime
-from main_langchain import run_query
+import config
+from main_langchain import run_query, start_background_refresh, warm_up_tasks, service_tags
+from single_flight import SingleFlight, normalize_question
+from inference_scheduler import InferenceScheduler, AdmissionError
 
 # Инициализация приложения
 app = FastAPI()
 
+# одинаковые одновременные вопросы обрабатываются одним вызовом run_query
+qa_flight = SingleFlight()
+
+# очередь с приоритетами и лимитами клиентов перед языковой моделью
+scheduler = InferenceScheduler(
+    run_query,
+    concurrency=config.INFERENCE_CONCURRENCY,
+    rate_limits=config.QA_RATE_LIMITS,
+    max_queue=config.QA_MAX_QUEUE
+)
+
+# состояние прогрева моделей для /ready: "warming_up", "ready" или "failed"
+readiness = {"status": "warming_up", "components": {}}
+
 
 
 
 # пример модели: описывает, что клиент должен отправить.
 class UserRequest(BaseModel):
     question: str
+    # необязательный фильтр по категориям услуг (см. medical_service_categories.json)
+    any_tags: Optional[list[str]] = None  # хотя бы одна из категорий (OR)
+    all_tags: Optional[list[str]] = None  # все перечисленные категории (AND)
 
 # описывает, что сервер вернёт
 class UserResponse(BaseModel):
@@ -20,14 +48,87 @@ class UserResponse(BaseModel):
     context: list[str]
 
 
+# отказ планировщика превращается в быстрый ответ 429/503 с заголовком Retry-After
+@app.exception_handler(AdmissionError)
+async def admission_error_handler(request: Request, exc: AdmissionError):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+OPENAPI_PATH = "openapi.yaml"
+
+
+def write_openapi_yaml(path: str = OPENAPI_PATH) -> bool:
+    """
+    Записывает спецификацию API в yaml, только если она изменилась.
+    Вызывается при сборке: python -m API
+    Запись атомарная (через временный файл) и под файловой блокировкой,
+    поэтому несколько воркеров не пишут файл одновременно.
+
+    :return: True, если файл был перезаписан.
+    """
+    content = yaml.dump(app.openapi(), default_flow_style=False, allow_unicode=True)
+    with FileLock(path + ".lock"):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                if f.read() == content:
+                    return False
+        except FileNotFoundError:
+            pass
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    return True
+
+
+async def warm_up_models():
+    """
+    Параллельно прогревает эмбеддинги, векторное хранилище и генератор одним пробным вызовом.
+    Неудачный прогрев повторяется с экспоненциальной паузой; если компонент так и не
+    прогрелся за config.WARM_UP_ATTEMPTS попыток, воркер помечается как "failed".
+    """
+    async def run(name, task):
+        for attempt in range(1, config.WARM_UP_ATTEMPTS + 1):
+            start = time.perf_counter()
+            try:
+                await run_in_threadpool(task)
+            except Exception as e:
+                readiness["components"][name] = f"ошибка (попытка {attempt}): {e}"
+                if attempt < config.WARM_UP_ATTEMPTS:
+                    await asyncio.sleep(min(2 ** attempt, 60))
+                continue
+            readiness["components"][name] = f"ok, {time.perf_counter() - start:.2f} с"
+            return True
+        return False
+
+    results = await asyncio.gather(*(run(name, task) for name, task in warm_up_tasks().items()))
+    readiness["status"] = "ready" if all(results) else "failed"
+    print(f"Прогрев моделей завершён ({readiness['status']}): {readiness['components']}")
+
+
 # специальная функция, котора будет вызываться при старте сервера
 @app.on_event("startup")
 async def generate_openapi_yaml():
-    # автоматическая генерации спецификации для API в yaml
-    openapi_schema = app.openapi()
-    with open("openapi.yaml", "w") as f:
-        yaml.dump(openapi_schema, f, default_flow_style=False, allow_unicode=True)
-    print("OpenAPI YAML сгенерирован при запуске сервера!")
+    # спецификация собирается заранее (python -m API); при запуске она генерируется,
+    # только если файла ещё нет, чтобы воркеры не пересобирали её при каждом старте
+    if not os.path.exists(OPENAPI_PATH) and await run_in_threadpool(write_openapi_yaml):
+        print("OpenAPI YAML сгенерирован при запуске сервера!")
+
+
+@app.on_event("startup")
+async def start_warm_up():
+    # прогрев идёт в фоне: /health отвечает сразу, /ready - после прогрева
+    app.state.warm_up_task = asyncio.ensure_future(warm_up_models())
+
+
+@app.on_event("startup")
+async def start_knowledge_base_refresh():
+    # фоновое обновление базы знаний с подменой ретривера без остановки сервера
+    start_background_refresh()
     
 
 # =====================
@@ -41,18 +142,64 @@ async def health():
     # docstring будет виден в /doc
     return {"status": "Ok", "timestamp": datetime.utcnow().isoformat() + "Z"}
 
+@app.get("/ready")
+async def ready():
+    """readiness-check; выдаёт Ready только после прогрева моделей, до этого - 503 (Warming up),
+    если прогрев не удался - 503 (Failed)"""
+    if readiness["status"] == "warming_up":
+        return JSONResponse(
+            status_code=503,
+            content={"status": "Warming up", "components": readiness["components"]},
+            headers={"Retry-After": "5"}
+        )
+    if readiness["status"] == "failed":
+        return JSONResponse(
+            status_code=503,
+            content={"status": "Failed", "components": readiness["components"]}
+        )
+    return {"status": "Ready", "components": readiness["components"]}
+
 @app.post("/qa", response_model=UserResponse,  summary="Запрос пользователя")
-async def answer_to_user(user: UserRequest) -> UserResponse:
+async def answer_to_user(user: UserRequest, request: Request,
+                         x_priority: Optional[str] = Header(None),
+                         x_client_id: Optional[str] = Header(None),
+                         x_deadline_ms: Optional[int] = Header(None)) -> UserResponse:
     """
-    * .split('Полезный ответ: ')[1].split("Вопрос пользователя:")[0]
+    * X-Priority: класс приоритета (health, interactive, batch), по умолчанию interactive
+    * X-Client-Id: идентификатор клиента для лимита запросов, по умолчанию IP-адрес
+    * X-Deadline-Ms: сколько миллисекунд клиент готов ждать ответ
+
+    При перегрузке возвращает 429/503 с заголовком Retry-After.
     """
-    answer = run_query(user.question)
+    try:
+        service_tags.where(any_tags=user.any_tags, all_tags=user.all_tags)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    priority_class = scheduler.priority_class(x_priority)
+    client_id = x_client_id or (request.client.host if request.client else "unknown")
+    scheduler.admit(client_id, priority_class)
+    timeout = x_deadline_ms / 1000 if x_deadline_ms else None
+
+    # run_query блокирующий, планировщик выполняет его в пуле потоков и не останавливает event loop.
+    # Класс приоритета входит в ключ, чтобы интерактивный запрос не ждал с приоритетом пакетного.
+    # Дедлайн у каждого клиента свой: общая задача снимается с очереди, только когда ушли все.
+    key = (normalize_question(user.question), priority_class,
+           tuple(sorted(user.any_tags or [])), tuple(sorted(user.all_tags or [])))
+    try:
+        answer = await qa_flight.run(key, scheduler.submit, user.question, user.any_tags, user.all_tags,
+                                     timeout=timeout, priority_class=priority_class)
+    except asyncio.TimeoutError:
+        raise AdmissionError(503, "Время ожидания запроса истекло", scheduler.retry_after())
     return UserResponse(answer=answer["answer"], context=answer["context"])
 
 
 # =====================
 #  Запуск сервера
 # =====================
+# Перед запуском (после изменения API) собрать спецификацию openapi.yaml:
+# python -m API
+#
 # uvicorn API:app --host 0.0.0.0 --port 8888 
 # --workers 4
 
@@ -83,4 +230,12 @@ FastAPI автоматически:
 
 Модели отделяют логику работы с данными от логики обработки запросов. Код становится аккуратным и поддерживаемым.
 =====================
-"""
\ No newline at end of file
+"""
+
+
+if __name__ == "__main__":
+    # сборка спецификации API как артефакта: python -m API
+    if write_openapi_yaml():
+        print(f"Спецификация записана в {OPENAPI_PATH}")
+    else:
+        print(f"Спецификация {OPENAPI_PATH} не изменилась")
@@ -3,3 +3,43 @@ TELEGRAM_API_TOKEN = "7248394247:AAFQbD9NDPa1dBQaptU5-DJzuhISU_44PmA"
 
 # Номер телефона call-центра
 CALL_CENTER_PHONE = "+7 123 456-78-90"
+
+# Векторное хранилище: "chroma" - ChromaDB, "numpy" - NumpyVectorStore (для небольших корпусов).
+# Шкалы релевантности у них разные (у NumpyVectorStore - косинусная близость, у Chroma -
+# 1 - sqrt(1 - косинусная близость)), порог score_threshold в main_langchain подобран для Chroma.
+VECTORSTORE_BACKEND = "chroma"
+
+# Период фонового обновления базы знаний в часах (0 - отключено).
+# Первая сборка начинается через этот период после первого запуска. Опубликованная версия
+# заменяет исходную коллекцию, и добавленные в неё вручную записи в поиске больше не участвуют.
+KB_REFRESH_INTERVAL_HOURS = 24
+
+# Планировщик запросов к модели: число одновременных генераций,
+# лимиты на клиента по классам (запросов в секунду, размер пачки) и длина очереди классов
+INFERENCE_CONCURRENCY = 1
+QA_RATE_LIMITS = {
+    "health": (1.0, 5),
+    "interactive": (0.2, 3),
+    "batch": (1.0, 10),
+}
+QA_MAX_QUEUE = {
+    "health": 4,
+    "interactive": 32,
+    "batch": 8,
+}
+
+# Сколько секунд бот ждёт ответа от API
+QA_TIMEOUT_SECONDS = 120
+
+# Голосовые сообщения: модели Whisper (быстрая - для коротких сообщений и под нагрузкой),
+# длительность, до которой используется быстрая модель, число одновременных распознаваний,
+# начиная с которого используется быстрая модель (включая текущее; TeleBot по умолчанию
+# обрабатывает сообщения в 2 потоках), и максимальная длительность речи в секундах
+WHISPER_SMALL_MODEL = "tiny"
+WHISPER_LARGE_MODEL = "base"
+WHISPER_SMALL_MODEL_MAX_SECONDS = 10
+WHISPER_BUSY_THRESHOLD = 2
+VOICE_MAX_SECONDS = 120
+
+# Число попыток прогрева каждой модели при запуске API (пауза между попытками растёт: 2, 4, 8... с)
+WARM_UP_ATTEMPTS = 5
@@ -0,0 +1,229 @@
+# inference_scheduler.py
+"""
+Планировщик запросов к языковой модели.
+
+Перед моделью стоит очередь с приоритетами: пробы здоровья обслуживаются раньше
+интерактивных пользователей, а те - раньше пакетных задач. Каждый клиент ограничен
+корзиной токенов (token bucket), длина очереди каждого класса ограничена, а запросы,
+чей клиент уже перестал ждать (истёк дедлайн), выбрасываются без запуска модели.
+При перегрузке клиент быстро получает 429/503 с заголовком Retry-After.
+"""
+import asyncio
+import itertools
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+# Классы приоритетов: меньшее значение обслуживается раньше
+PRIORITIES = {
+    "health": 0,
+    "interactive": 1,
+    "batch": 2,
+}
+DEFAULT_PRIORITY = "interactive"
+
+
+class AdmissionError(Exception):
+    """Запрос отклонён планировщиком (перегрузка, лимит клиента или истёкший дедлайн)"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float = 1.0):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не более burst накопленных"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> float:
+        """
+        Забирает один токен.
+
+        :return: 0, если токен получен, иначе время ожидания следующего токена в секундах.
+        """
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.burst
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    args: Tuple = field(compare=False)
+    deadline: Optional[float] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    priority_class: str = field(compare=False)
+
+
+class InferenceScheduler:
+    """
+    Очередь с приоритетами перед блокирующей функцией (run_query).
+
+    Функция выполняется в пуле потоков не более чем concurrency раз одновременно.
+    """
+
+    MAX_BUCKETS = 10000  # при превышении удаляются полные (неактивные) корзины
+
+    def __init__(self,
+                 func: Callable[..., Any],
+                 concurrency: int = 1,
+                 rate_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+                 max_queue: Optional[Dict[str, int]] = None,
+                 service_time: float = 5.0):
+        """
+        :param func: Блокирующая функция инференса.
+        :param concurrency: Количество одновременно выполняемых вызовов func.
+        :param rate_limits: Класс -> (запросов в секунду, размер пачки) на одного клиента.
+        :param max_queue: Класс -> максимальное число запросов в очереди.
+        :param service_time: Начальная оценка времени обработки одного запроса, секунды.
+        """
+        self.func = func
+        self.concurrency = concurrency
+        self.rate_limits = rate_limits or {}
+        self.max_queue = max_queue or {}
+        self.service_time = service_time
+
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers = []
+        self._seq = itertools.count()
+        self._queued = {name: 0 for name in PRIORITIES}
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+
+        self.stats = {"completed": 0, "rejected": 0, "expired": 0}
+
+    # =====================
+    #  Допуск
+    # =====================
+
+    @staticmethod
+    def priority_class(name: Optional[str]) -> str:
+        """Проверяет название класса приоритета"""
+        if not name:
+            return DEFAULT_PRIORITY
+        if name not in PRIORITIES:
+            raise AdmissionError(400, f"Неизвестный класс приоритета: {name}")
+        return name
+
+    def admit(self, client_id: str, priority_class: str):
+        """
+        Проверяет лимит клиента; при превышении выбрасывает AdmissionError(429).
+
+        :param client_id: Идентификатор клиента.
+        :param priority_class: Класс приоритета запроса.
+        """
+        limit = self.rate_limits.get(priority_class)
+        if limit is None:
+            return
+
+        key = (client_id, priority_class)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.MAX_BUCKETS:
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.is_full()}
+            bucket = self._buckets[key] = TokenBucket(*limit)
+
+        wait = bucket.acquire()
+        if wait > 0:
+            self.stats["rejected"] += 1
+            raise AdmissionError(429, "Слишком много запросов, повторите позже", wait)
+
+    # =====================
+    #  Очередь
+    # =====================
+
+    async def submit(self, *args, priority_class: str = DEFAULT_PRIORITY,
+                     deadline: Optional[float] = None) -> Any:
+        """
+        Ставит вызов func(*args) в очередь и ждёт результат.
+
+        :param priority_class: Класс приоритета.
+        :param deadline: Момент (time.monotonic()), после которого ответ уже не нужен.
+        :return: Результат func.
+        """
+        self._ensure_workers()
+
+        limit = self.max_queue.get(priority_class)
+        if limit is not None and self._queued[priority_class] >= limit:
+            self.stats["rejected"] += 1
+            raise AdmissionError(503, "Сервис перегружен, повторите позже", self.retry_after())
+
+        if deadline is not None and time.monotonic() >= deadline:
+            self.stats["expired"] += 1
+            raise AdmissionError(503, "Время ожидания запроса истекло")
+
+        job = _Job(PRIORITIES[priority_class], next(self._seq), args, deadline,
+                   asyncio.get_running_loop().create_future(), priority_class)
+        self._queued[priority_class] += 1
+        self._queue.put_nowait(job)
+
+        if deadline is None:
+            return await job.future
+        try:
+            # по истечении дедлайна future отменяется, и воркер пропустит задачу
+            return await asyncio.wait_for(job.future, timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            raise AdmissionError(503, "Время ожидания запроса истекло", self.retry_after())
+
+    def retry_after(self) -> float:
+        """Оценка времени до освобождения очереди, секунды"""
+        queued = sum(self._queued.values())
+        return self.service_time * (queued + 1) / self.concurrency
+
+    def queue_size(self) -> Dict[str, int]:
+        return dict(self._queued)
+
+    def _ensure_workers(self):
+        # Очередь и воркеры создаются в работающем event loop при первом запросе
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.concurrency)]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self._queued[job.priority_class] -= 1
+
+            # Клиент уже перестал ждать - модель не запускаем
+            if job.future.done():
+                self.stats["expired"] += 1
+                continue
+            if job.deadline is not None and time.monotonic() >= job.deadline:
+                self.stats["expired"] += 1
+                job.future.set_exception(AdmissionError(503, "Время ожидания запроса истекло"))
+                continue
+
+            start = time.monotonic()
+            try:
+                result = await run_in_threadpool(self.func, *job.args)
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+                self.stats["completed"] += 1
+            finally:
+                # Скользящее среднее времени обработки для оценки Retry-After
+                self.service_time = 0.8 * self.service_time + 0.2 * (time.monotonic() - start)
@@ -0,0 +1,314 @@
+# knowledge_refresh.py
+"""
+Фоновое обновление базы знаний.
+
+Каждое обновление собирает данные (ClinicScraper -> MedicalDataProcessor) в новую
+версию хранилища (отдельная коллекция Chroma или каталог NumpyVectorStore), и только
+полностью заполненная версия подменяет текущую. Неполная версия (не удалось получить
+режим работы или перечень услуг, либо записей заметно меньше, чем в текущей версии)
+удаляется, а пользователи продолжают работать со старой.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Callable, List, Optional, Tuple
+
+from filelock import FileLock, Timeout
+
+from СкрапИОбработ import ClinicScraper, MedicalDataProcessor
+
+
+class KnowledgeBaseRefresher:
+    """
+    Периодически пересобирает базу знаний и атомарно переключает ретривер.
+
+    Активная версия записывается в файл VERSION_FILE, поэтому несколько воркеров API
+    используют одну и ту же версию: пересборку выполняет тот, кто захватил файловую
+    блокировку, остальные лишь переключаются на опубликованную версию. Время, раньше
+    которого пересборку не начинаем (после неудачной сборки или при первом запуске),
+    тоже общее и хранится в файле NEXT_BUILD_FILE.
+
+    Пока ни одна версия не опубликована, используется исходная коллекция. Первая сборка
+    начинается через interval после первого запуска, а не сразу, и после публикации
+    исходная коллекция (вместе с добавленными в неё вручную записями) больше не используется.
+    """
+
+    VERSION_FILE = "kb_version.txt"
+    NEXT_BUILD_FILE = "kb_next_build.txt"
+    LOCK_FILE = "kb_refresh.lock"
+    VERSION_PREFIX = "kb_"
+    VERSION_FORMAT = "%Y%m%d_%H%M%S"
+
+    def __init__(self,
+                 open_store: Callable[[str], object],
+                 drop_store: Callable[[str], None],
+                 on_swap: Callable[[object, str], None],
+                 state_dir: str,
+                 interval: float = 24 * 3600,
+                 poll_interval: float = 60,
+                 retry_interval: float = 15 * 60,
+                 keep_versions: int = 2,
+                 min_size_ratio: float = 0.8,
+                 batch_size: int = 256,
+                 scraper: Optional[ClinicScraper] = None,
+                 processor: Optional[MedicalDataProcessor] = None):
+        """
+        :param open_store: Открывает (создаёт) хранилище указанной версии.
+        :param drop_store: Удаляет хранилище указанной версии.
+        :param on_swap: Вызывается с новым хранилищем и его версией при переключении.
+        :param state_dir: Каталог для файла активной версии и блокировки.
+        :param interval: Период пересборки базы знаний, секунды.
+        :param poll_interval: Период проверки опубликованной версии, секунды.
+        :param retry_interval: Пауза перед повторной сборкой после неудачной, секунды.
+        :param keep_versions: Сколько последних версий хранить (для отката).
+        :param min_size_ratio: Новая версия не публикуется, если в ней меньше записей,
+                               чем эта доля от текущей версии.
+        :param batch_size: Размер пачки при загрузке записей в хранилище.
+        """
+        self.open_store = open_store
+        self.drop_store = drop_store
+        self.on_swap = on_swap
+        self.state_dir = state_dir
+        self.interval = interval
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self.keep_versions = keep_versions
+        self.min_size_ratio = min_size_ratio
+        self.batch_size = batch_size
+        self.scraper = scraper or ClinicScraper(
+            base_working_hours_url="https://clinica.chitgma.ru/informatsiya-po-otdeleniyu-9")
+        self.processor = processor or MedicalDataProcessor()
+
+        self.version = self.read_version(state_dir)
+        self._stop = threading.Event()
+        self._thread = None
+
+    # =====================
+    #  Управление фоновым потоком
+    # =====================
+
+    def start(self):
+        """Запускает фоновый поток обновления"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="kb-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Останавливает фоновый поток обновления"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Ошибка фонового обновления базы знаний: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def tick(self):
+        """Переключается на опубликованную версию и при необходимости пересобирает базу"""
+        self._sync()
+        if self._is_due():
+            try:
+                with FileLock(os.path.join(self.state_dir, self.LOCK_FILE), timeout=0):
+                    # Пока ждали блокировку, другой воркер мог уже опубликовать версию
+                    self._sync()
+                    if self._is_due():
+                        self.refresh()
+            except Timeout:
+                pass  # Обновление уже выполняет другой воркер
+
+    # =====================
+    #  Пересборка
+    # =====================
+
+    def refresh(self) -> bool:
+        """
+        Собирает новую версию базы знаний и переключается на неё.
+
+        :return: True, если новая версия опубликована; False, если она оказалась неполной.
+        """
+        version = self.VERSION_PREFIX + datetime.now().strftime(self.VERSION_FORMAT)
+        print(f"Сборка новой версии базы знаний {version}...")
+        store = self.open_store(version)
+        try:
+            hours_count, services_count = self._ingest(store)
+        except Exception:
+            self.drop_store(version)
+            self._postpone(self.retry_interval)
+            raise
+
+        total = hours_count + services_count
+        problem = self._check_build(hours_count, services_count)
+        if problem:
+            # Откат: неполная версия не публикуется, продолжаем работать со старой
+            print(f"Версия {version} не опубликована ({problem}), "
+                  f"остаётся текущая версия {self.version}.")
+            self.drop_store(version)
+            self._postpone(self.retry_interval)
+            return False
+
+        self._publish(version, total)
+        self._swap(store, version)
+        self._drop_old_versions()
+        print(f"База знаний обновлена до версии {version} ({total} записей).")
+        return True
+
+    def _ingest(self, store) -> Tuple[int, int]:
+        """
+        Загружает режим работы и перечень услуг в хранилище.
+
+        :return: Число записей режима работы и число записей услуг.
+        """
+        hours_count = 0
+        services_count = 0
+
+        working_hours = self.scraper.scrape_working_hours() or []
+        if working_hours:
+            texts = [item.to_str() for item in working_hours]
+            store.add_texts(texts=texts, metadatas=[{"category": "режим работы"} for _ in texts])
+            hours_count = len(texts)
+
+        # Скрапер сам перехватывает ошибки загрузки PDF и возвращает None
+        services = self.scraper.scrape_services() or []
+        if services:
+            entries = self.processor.build_catalogue(services).iter_entries()
+            while True:
+                batch = list(islice(entries, self.batch_size))
+                if not batch:
+                    break
+                store.add_texts(texts=[text for text, _ in batch],
+                                metadatas=[metadata for _, metadata in batch])
+                services_count += len(batch)
+
+        return hours_count, services_count
+
+    def _check_build(self, hours_count: int, services_count: int) -> Optional[str]:
+        """Возвращает причину, по которой версию нельзя публиковать (None - можно)"""
+        if hours_count == 0:
+            return "не получен режим работы"
+        if services_count == 0:
+            return "не получен перечень услуг"
+
+        current = self._size(self.version)
+        total = hours_count + services_count
+        if current and total < current * self.min_size_ratio:
+            return f"{total} записей против {current} в текущей версии"
+        return None
+
+    # =====================
+    #  Версии
+    # =====================
+
+    @classmethod
+    def read_version(cls, state_dir: str) -> Optional[str]:
+        """Возвращает опубликованную версию базы знаний (None - исходная коллекция)"""
+        try:
+            with open(os.path.join(state_dir, cls.VERSION_FILE), 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _publish(self, version: str, size: int):
+        """Атомарно записывает новую активную версию"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = os.path.join(self.state_dir, self.VERSION_FILE)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(path + ".tmp", path)
+
+        history = self._history()
+        history.append((version, size))
+        self._write_history(history)
+
+    def _history_path(self) -> str:
+        return os.path.join(self.state_dir, self.VERSION_FILE + ".history")
+
+    def _history(self) -> List[Tuple[str, Optional[int]]]:
+        """Опубликованные версии и число записей в них, от старых к новым"""
+        history = []
+        try:
+            with open(self._history_path(), 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if parts:
+                        history.append((parts[0], int(parts[1]) if len(parts) > 1 else None))
+        except FileNotFoundError:
+            pass
+        return history
+
+    def _write_history(self, history: List[Tuple[str, Optional[int]]]):
+        path = self._history_path()
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            f.write("\n".join(f"{version} {size}" if size is not None else version
+                              for version, size in history))
+        os.replace(path + ".tmp", path)
+
+    def _size(self, version: Optional[str]) -> Optional[int]:
+        """Число записей в опубликованной версии (None - неизвестно)"""
+        for published, size in self._history():
+            if published == version:
+                return size
+        return None
+
+    def _drop_old_versions(self):
+        """Удаляет версии старше keep_versions последних"""
+        history = self._history()
+        stale, keep = history[:-self.keep_versions], history[-self.keep_versions:]
+        for version, _ in stale:
+            try:
+                self.drop_store(version)
+            except Exception as e:
+                print(f"Не удалось удалить версию {version}: {e}")
+        if stale:
+            self._write_history(keep)
+
+    def _sync(self):
+        """Переключается на версию, опубликованную другим воркером"""
+        published = self.read_version(self.state_dir)
+        if published and published != self.version:
+            self._swap(self.open_store(published), published)
+
+    def _swap(self, store, version: str):
+        self.on_swap(store, version)
+        self.version = version
+
+    def _next_build(self) -> Optional[float]:
+        """Время (time.time()), раньше которого не начинаем сборку (None - не задано)"""
+        try:
+            with open(os.path.join(self.state_dir, self.NEXT_BUILD_FILE), 'r', encoding='utf-8') as f:
+                return float(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _postpone(self, delay: float):
+        """Откладывает следующую сборку на delay секунд для всех воркеров"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = os.path.join(self.state_dir, self.NEXT_BUILD_FILE)
+        with open(path + f".{os.getpid()}.tmp", 'w', encoding='utf-8') as f:
+            f.write(str(time.time() + delay))
+        os.replace(path + f".{os.getpid()}.tmp", path)
+
+    def _is_due(self) -> bool:
+        """Пора ли пересобирать базу (по времени создания текущей версии)"""
+        next_build = self._next_build()
+        if next_build is not None and time.time() < next_build:
+            return False
+        if self.version is None:
+            if next_build is None:
+                # Первый запуск: не собираем базу одновременно с прогревом моделей,
+                # первая сборка - через interval
+                self._postpone(self.interval)
+                return False
+            return True
+        try:
+            built = datetime.strptime(self.version[len(self.VERSION_PREFIX):], self.VERSION_FORMAT)
+        except ValueError:
+            return True
+        return time.time() - built.timestamp() >= self.interval
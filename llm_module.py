@@ -4,7 +4,7 @@ import requests
 
 
 class RealLLM(BaseLLM):
-    def process(self, input_text: str) -> str:
+    def process(self, input_text: str, client_id: str = None) -> str:
         # Если в запросе есть "health", выполняем GET-запрос
         if "health" in input_text.lower():
             return self.check_health()
@@ -12,12 +12,20 @@ class RealLLM(BaseLLM):
         url = "http://127.0.0.1:8888/qa"
         headers = {
             "accept": "application/json",
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            # Интерактивный запрос: сервер не выполняет его, если мы уже перестали ждать
+            "X-Priority": "interactive",
+            "X-Deadline-Ms": str(int(config.QA_TIMEOUT_SECONDS * 1000))
         }
+        if client_id is not None:
+            headers["X-Client-Id"] = client_id
         data = {"question": input_text}
 
         try:
-            response = requests.post(url, json=data, headers=headers)
+            response = requests.post(url, json=data, headers=headers, timeout=config.QA_TIMEOUT_SECONDS)
+            if response.status_code in (429, 503):
+                retry_after = response.headers.get("Retry-After", "несколько")
+                return f"Сервис сейчас перегружен, попробуйте повторить вопрос через {retry_after} сек."
             response.raise_for_status()
             result = response.json()
             return result.get("answer", "Извините, не удалось получить ответ.")
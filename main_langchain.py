@@ -7,7 +7,13 @@ from langchain.chains import RetrievalQA
 from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
 from langchain_core.prompts import PromptTemplate
 
+import os
+import shutil
+from itertools import islice
+
 from СкрапИОбработ import *
+from knowledge_refresh import KnowledgeBaseRefresher
+import config
 
 def read_file_to_list(file_path):
     """
@@ -36,23 +42,140 @@ def add_new_texts_to_db(texts, metadatas):
     :param texts: Список строк, новых данных.
     :param metadata: Список словарей, содержащих метаданные.
     """
-
-    #временно /------------------------------------------------------------------/
-    for i in metadatas:
-        i["tags"] = ", ".join(i["tags"]) if i["tags"] else "нет тегов"
-
     vectorstore.add_texts(texts = texts, metadatas = metadatas)
     print(f"Добавлено {len(texts)} новых записей.")
 
 
-def run_query(query):
+def add_catalogue_to_db(catalogue, batch_size=256):
+    """
+    Функция для добавления услуг из каталога пачками, без построения полных списков
+
+    :param catalogue: Каталог услуг ServiceCatalogue.
+    :param batch_size: Количество записей в одной пачке.
+    """
+    entries = catalogue.iter_entries()
+    total = 0
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            break
+        texts = [text for text, _ in batch]
+        metadatas = [metadata for _, metadata in batch]
+        vectorstore.add_texts(texts=texts, metadatas=metadatas)
+        total += len(batch)
+    print(f"Добавлено {total} новых записей.")
+
+
+def open_vectorstore(version=None):
+    """
+    Открывает (или создаёт) векторное хранилище указанной версии базы знаний
+
+    :param version: Версия базы знаний; None - исходная коллекция.
+    :return: Векторное хранилище.
+    """
+    if config.VECTORSTORE_BACKEND == "numpy":
+        directory = os.path.join(persist_directory, version) if version else persist_directory
+        return NumpyVectorStore(persist_directory=directory, embedding_function=embeddings)
+    if version:
+        return Chroma(collection_name=version, persist_directory=persist_directory,
+                      embedding_function=embeddings)
+    return Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+
+
+def drop_vectorstore(version):
+    """
+    Удаляет векторное хранилище указанной версии базы знаний
+
+    :param version: Версия базы знаний.
+    """
+    if config.VECTORSTORE_BACKEND == "numpy":
+        shutil.rmtree(os.path.join(persist_directory, version), ignore_errors=True)
+    else:
+        open_vectorstore(version).delete_collection()
+
+
+def create_qa_chain(store, filter=None):
+    """
+    Создание цепочки для поиска и ответов поверх хранилища
+
+    :param store: Векторное хранилище.
+    :param filter: Фильтр по метаданным для поиска (например, ServiceTags.where()).
+    :return: Цепочка RetrievalQA.
+    """
+    search_kwargs = {"score_threshold": 0.5, "k": 10}
+    if filter is not None:
+        search_kwargs["filter"] = filter
+    return RetrievalQA.from_chain_type(
+        llm=llm,
+        chain_type="stuff",
+        retriever=store.as_retriever(search_kwargs=search_kwargs),#
+        return_source_documents=True,
+        verbose=False,
+        chain_type_kwargs={"prompt": PROMPT}  # Передаем новый шаблон
+    )
+
+
+def swap_vectorstore(store, version):
+    """
+    Переключает хранилище и цепочку на новую версию базы знаний.
+    Присваивание глобальной переменной атомарно, поэтому запросы используют
+    либо старую, либо новую цепочку целиком.
+
+    :param store: Новое векторное хранилище (уже заполненное).
+    :param version: Версия базы знаний.
+    """
+    global vectorstore, qa_chain
+    new_chain = create_qa_chain(store)
+    vectorstore = store
+    qa_chain = new_chain
+    print(f"Используется версия базы знаний {version}.")
+
+
+def start_background_refresh():
+    """
+    Запускает фоновое обновление базы знаний (период задаётся в config.py)
+
+    :return: Объект KnowledgeBaseRefresher или None, если обновление отключено.
+    """
+    if config.KB_REFRESH_INTERVAL_HOURS <= 0:
+        return None
+    refresher = KnowledgeBaseRefresher(
+        open_store=open_vectorstore,
+        drop_store=drop_vectorstore,
+        on_swap=swap_vectorstore,
+        state_dir=persist_directory,
+        interval=config.KB_REFRESH_INTERVAL_HOURS * 3600
+    )
+    refresher.start()
+    return refresher
+
+
+def warm_up_tasks():
+    """
+    Пробные вызовы для прогрева моделей перед первым запросом
+
+    :return: Словарь: название компонента -> функция пробного вызова.
+    """
+    return {
+        "embeddings": lambda: embeddings.embed_query("прогрев"),
+        "vectorstore": lambda: vectorstore.similarity_search("прогрев", k=1),
+        "generator": lambda: pipe("прогрев", max_new_tokens=1),
+    }
+
+
+def run_query(query, any_tags=None, all_tags=None):
     """
     Функция запроса к цепочке
 
     :param query: Строка запроса.
+    :param any_tags: Искать только услуги, имеющие хотя бы одну из категорий (OR).
+    :param all_tags: Искать только услуги, имеющие все перечисленные категории (AND).
     :return: Словарь, содержащий ответ и контекст (исходные документы).
     """
-    response = qa_chain.invoke(query)
+    where = service_tags.where(any_tags=any_tags, all_tags=all_tags)
+    # qa_chain и vectorstore могут быть подменены фоновым обновлением
+    chain = qa_chain if where is None else create_qa_chain(vectorstore, filter=where)
+    response = chain.invoke(query)
     #.split("Вопрос пользователя:")[1].split('Полезный ответ: ')[1]
     answer = response["result"]  # Ответ модели
     source_documents = response["source_documents"]  # Исходные документы
@@ -66,15 +189,21 @@ def run_query(query):
     }
 
 
+# Схема категорий услуг (биты и булевы поля tag_<категория> в метаданных)
+service_tags = ServiceTags.from_config()
+
 # 2. Инициализация модели эмбеддингов
 embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
 
-# 3. Инициализация ChromaDB
-persist_directory = "./chroma_db"
-vectorstore = Chroma(
-    persist_directory=persist_directory,
-    embedding_function=embeddings
-)
+# 3. Инициализация векторного хранилища (ChromaDB или NumpyVectorStore, см. config.py)
+if config.VECTORSTORE_BACKEND == "numpy":
+    from numpy_vectorstore import NumpyVectorStore
+    persist_directory = "./numpy_db"
+else:
+    persist_directory = "./chroma_db"
+
+# Текущая версия базы знаний, опубликованная фоновым обновлением
+vectorstore = open_vectorstore(KnowledgeBaseRefresher.read_version(persist_directory))
 
 
 
@@ -135,14 +264,7 @@ PROMPT = PromptTemplate(
 )
 
 # 6. Создание цепочки для поиска и ответов
-qa_chain = RetrievalQA.from_chain_type(
-    llm=llm,
-    chain_type="stuff",
-    retriever=vectorstore.as_retriever(search_kwargs={"score_threshold": 0.5, "k": 10}),#
-    return_source_documents=True,
-    verbose=False,
-    chain_type_kwargs={"prompt": PROMPT}  # Передаем новый шаблон
-)
+qa_chain = create_qa_chain(vectorstore)
 
 
 # 7. Добавление новых записей - время работы 
@@ -173,13 +295,16 @@ add_new_texts_to_db(w_hours, metadatas)
 scr = ClinicScraper(base_working_hours_url="https://clinica.chitgma.ru/informatsiya-po-otdeleniyu-9")
 table = scr.scrape_services()
 proces = MedicalDataProcessor()
-ready_entries = proces.process_raw_data(table)
+catalogue = proces.build_catalogue(table)
 
-add_new_texts_to_db(ready_entries.texts, ready_entries.metadata)
+add_catalogue_to_db(catalogue)
 '''
 # Удаление всей коллекции при дублировании
 # vectorstore.reset_collection()
 
+# Полное обновление базы знаний в новую версию без остановки API: start_background_refresh()
+# (или однократно: KnowledgeBaseRefresher(open_vectorstore, drop_vectorstore, swap_vectorstore, persist_directory).refresh())
+
 
 # 8. Выполнение запроса
 
@@ -0,0 +1,412 @@
+# numpy_vectorstore.py
+"""
+Лёгкое векторное хранилище для небольших корпусов (несколько тысяч записей).
+
+Все векторы лежат в одной непрерывной матрице NumPy (float32 или float16),
+нормированной по строкам, поэтому косинусная близость считается одним
+матричным умножением. Матрица сохраняется на диск в .npy и при загрузке
+отображается в память (mmap). Для больших корпусов можно включить HNSW-индекс
+(chroma-hnswlib).
+
+float16 - режим экономии памяти, а не скорости: на CPU умножение в float16
+не ускоряется BLAS, поэтому поиск идёт блоками с приведением к float32 и
+медленнее, чем в float32. Для минимальной задержки используйте float32.
+"""
+import json
+import os
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+try:
+    import hnswlib
+except ImportError:  # HNSW необязателен
+    hnswlib = None
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Векторное хранилище на NumPy с точным (brute-force) косинусным поиском.
+
+    Совместимо с интерфейсом LangChain ``VectorStore``, поэтому может
+    использоваться вместо ``Chroma`` в ``main_langchain``.
+    """
+
+    VECTORS_FILE = "vectors.npy"
+    DOCS_FILE = "docs.json"
+    BLOCK_SIZE = 4096  # Размер блока строк при поиске по float16-матрице
+
+    def __init__(self,
+                 embedding_function: Embeddings,
+                 persist_directory: Optional[str] = None,
+                 dtype: str = "float32",
+                 use_hnsw: bool = False,
+                 hnsw_min_size: int = 20000,
+                 hnsw_ef: int = 64):
+        """
+        :param embedding_function: Модель эмбеддингов.
+        :param persist_directory: Каталог для хранения матрицы и документов (None - только в памяти).
+        :param dtype: Тип хранения векторов: "float32" (быстрый поиск) или
+                      "float16" (вдвое меньше памяти, поиск медленнее).
+        :param use_hnsw: Использовать HNSW-индекс вместо полного перебора.
+        :param hnsw_min_size: Минимальный размер корпуса, начиная с которого строится HNSW.
+        :param hnsw_ef: Параметр ef для поиска по HNSW.
+        """
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Неподдерживаемый тип векторов: {dtype}")
+        if use_hnsw and hnswlib is None:
+            raise ImportError("Для HNSW-индекса требуется пакет chroma-hnswlib")
+
+        self._embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.dtype = np.dtype(dtype)
+        self.use_hnsw = use_hnsw
+        self.hnsw_min_size = hnsw_min_size
+        self.hnsw_ef = hnsw_ef
+
+        self._vectors = None  # Матрица (N, D), строки нормированы
+        self._texts: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._ids: List[str] = []
+        self._mask_cache: Dict[Tuple[str, Any], np.ndarray] = {}
+        self._hnsw = None
+
+        if persist_directory and os.path.exists(self._vectors_path()):
+            self._load()
+
+    # =====================
+    #  Интерфейс VectorStore
+    # =====================
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def add_texts(self,
+                  texts: Iterable[str],
+                  metadatas: Optional[List[Dict]] = None,
+                  ids: Optional[List[str]] = None,
+                  **kwargs: Any) -> List[str]:
+        """
+        Добавляет тексты в хранилище.
+
+        :param texts: Тексты для добавления.
+        :param metadatas: Метаданные для каждого текста.
+        :param ids: Идентификаторы записей (генерируются, если не заданы).
+        :return: Список идентификаторов добавленных записей.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        if metadatas is None:
+            metadatas = [{} for _ in texts]
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in texts]
+
+        new_vectors = self._normalize(np.asarray(
+            self._embedding_function.embed_documents(texts), dtype=np.float32))
+
+        if self._vectors is None or len(self._vectors) == 0:
+            self._vectors = new_vectors.astype(self.dtype)
+        else:
+            # np.concatenate создаёт копию в памяти, mmap-файл при этом не меняется
+            self._vectors = np.concatenate([self._vectors, new_vectors.astype(self.dtype)])
+
+        self._texts.extend(texts)
+        self._metadatas.extend(dict(m) for m in metadatas)
+        self._ids.extend(ids)
+        self._invalidate()
+
+        if self.persist_directory:
+            self._save()
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Удаляет записи по идентификаторам."""
+        if ids is None:
+            raise ValueError("Не заданы идентификаторы удаляемых записей")
+        to_delete = set(ids)
+        keep = [i for i, doc_id in enumerate(self._ids) if doc_id not in to_delete]
+
+        if self._vectors is not None:
+            self._vectors = np.ascontiguousarray(self._vectors[keep])
+        self._texts = [self._texts[i] for i in keep]
+        self._metadatas = [self._metadatas[i] for i in keep]
+        self._ids = [self._ids[i] for i in keep]
+        self._invalidate()
+
+        if self.persist_directory:
+            self._save()
+        return True
+
+    def get_by_ids(self, ids: List[str], /) -> List[Document]:
+        positions = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        return [self._document(positions[doc_id]) for doc_id in ids if doc_id in positions]
+
+    def similarity_search(self, query: str, k: int = 4,
+                          filter: Optional[Dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter=filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     filter: Optional[Dict] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Поиск ближайших документов по косинусной близости.
+
+        :param query: Строка запроса.
+        :param k: Количество результатов.
+        :param filter: Фильтр по метаданным, например {"category": "услуга"}
+                       или ServiceTags.where(any_tags=[...], all_tags=[...]).
+        :return: Список пар (документ, косинусная близость).
+        """
+        embedding = self._embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k, filter=filter)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict] = None,
+                                    **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter=filter)]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict] = None) -> List[Tuple[Document, float]]:
+        """Поиск ближайших документов по готовому вектору запроса."""
+        if self._vectors is None or len(self._vectors) == 0 or k <= 0:
+            return []
+
+        query = self._normalize(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+        mask = self._filter_mask(filter) if filter else None
+
+        index = self._hnsw_index()
+        if index is not None:
+            indices, scores = self._search_hnsw(index, query, k, mask)
+        else:
+            indices, scores = self._search_exact(query, k, mask)
+
+        return [(self._document(i), float(s)) for i, s in zip(indices, scores)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Релевантность - косинусная близость, отрицательная обрезается до 0: несвязанные
+        # (ортогональные) векторы получают 0. Шкала отличается от Chroma с расстоянием l2
+        # по умолчанию (1 - sqrt(1 - s)), поэтому score_threshold при смене хранилища нужно подбирать заново.
+        return lambda score: max(0.0, score)
+
+    @classmethod
+    def from_texts(cls,
+                   texts: List[str],
+                   embedding: Embeddings,
+                   metadatas: Optional[List[Dict]] = None,
+                   ids: Optional[List[str]] = None,
+                   **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    # =====================
+    #  Поиск
+    # =====================
+
+    def _search_exact(self, query: np.ndarray, k: int,
+                      mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Полный перебор: одно умножение матрицы на вектор и argpartition."""
+        scores = self._scores(query)
+        if mask is not None:
+            scores[~mask] = -np.inf
+            k = min(k, int(mask.sum()))
+        k = min(k, len(scores))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        """Косинусная близость запроса со всеми строками матрицы."""
+        if self.dtype != np.float16:
+            return self._vectors @ query
+        # Умножение в float16 на CPU не ускоряется BLAS, поэтому считаем блоками в float32
+        scores = np.empty(len(self._vectors), dtype=np.float32)
+        for start in range(0, len(self._vectors), self.BLOCK_SIZE):
+            block = self._vectors[start:start + self.BLOCK_SIZE]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores
+
+    def _search_hnsw(self, index, query: np.ndarray, k: int,
+                     mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Приближённый поиск по HNSW-индексу."""
+        row_filter = None
+        if mask is not None:
+            k = min(k, int(mask.sum()))
+            row_filter = lambda label: bool(mask[label])
+        k = min(k, index.get_current_count())
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        index.set_ef(max(self.hnsw_ef, k))
+        labels, distances = index.knn_query(query, k=k, filter=row_filter)
+        # Для пространства "cosine" hnswlib возвращает 1 - косинусная близость
+        return labels[0], 1.0 - distances[0]
+
+    def _hnsw_index(self):
+        """Лениво строит HNSW-индекс, если он включён и корпус достаточно большой."""
+        if not self.use_hnsw or len(self._vectors) < self.hnsw_min_size:
+            return None
+        if self._hnsw is None:
+            index = hnswlib.Index(space="cosine", dim=self._vectors.shape[1])
+            index.init_index(max_elements=len(self._vectors), ef_construction=200, M=16)
+            index.add_items(np.asarray(self._vectors, dtype=np.float32),
+                            np.arange(len(self._vectors)))
+            self._hnsw = index
+        return self._hnsw
+
+    def _filter_mask(self, filter: Dict) -> np.ndarray:
+        """
+        Строит булеву маску строк по фильтру метаданных в формате Chroma:
+        {"ключ": значение}, {"ключ": {"$eq" | "$ne" | "$in" | "$nin": ...}},
+        {"$and": [...]}, {"$or": [...]}.
+        Маски для каждой пары (ключ, значение) кэшируются до изменения данных,
+        поэтому повторные запросы по тегам сводятся к операциям над булевыми массивами.
+        """
+        mask = np.ones(len(self._metadatas), dtype=bool)
+        for key, value in filter.items():
+            if key == "$and":
+                for clause in value:
+                    mask &= self._filter_mask(clause)
+            elif key == "$or":
+                any_mask = np.zeros(len(self._metadatas), dtype=bool)
+                for clause in value:
+                    any_mask |= self._filter_mask(clause)
+                mask &= any_mask
+            elif isinstance(value, dict):
+                mask &= self._operator_mask(key, value)
+            else:
+                mask &= self._equals_mask(key, value)
+        return mask
+
+    def _operator_mask(self, key: str, condition: Dict) -> np.ndarray:
+        """Маска для условия вида {"$оператор": значение} по одному полю."""
+        mask = np.ones(len(self._metadatas), dtype=bool)
+        for op, value in condition.items():
+            if op == "$eq":
+                mask &= self._equals_mask(key, value)
+            elif op == "$ne":
+                mask &= ~self._equals_mask(key, value)
+            elif op in ("$in", "$nin"):
+                in_mask = np.zeros(len(self._metadatas), dtype=bool)
+                for item in value:
+                    in_mask |= self._equals_mask(key, item)
+                mask &= in_mask if op == "$in" else ~in_mask
+            else:
+                raise ValueError(f"Неподдерживаемый оператор фильтра: {op}")
+        return mask
+
+    def _equals_mask(self, key: str, value: Any) -> np.ndarray:
+        cache_key = (key, value)
+        if cache_key not in self._mask_cache:
+            self._mask_cache[cache_key] = np.fromiter(
+                (m.get(key) == value for m in self._metadatas),
+                dtype=bool, count=len(self._metadatas))
+        return self._mask_cache[cache_key]
+
+    # =====================
+    #  Вспомогательные методы
+    # =====================
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _document(self, i: int) -> Document:
+        # Копия метаданных: изменения у вызывающего не должны затрагивать хранилище и кэш масок фильтров
+        return Document(page_content=self._texts[i], metadata=dict(self._metadatas[i]), id=self._ids[i])
+
+    def _invalidate(self):
+        self._mask_cache.clear()
+        self._hnsw = None
+
+    def _vectors_path(self) -> str:
+        return os.path.join(self.persist_directory, self.VECTORS_FILE)
+
+    def _docs_path(self) -> str:
+        return os.path.join(self.persist_directory, self.DOCS_FILE)
+
+    def _save(self):
+        """Сохраняет матрицу и документы (через временные файлы, чтобы не повредить старые)."""
+        os.makedirs(self.persist_directory, exist_ok=True)
+        vectors = self._vectors if self._vectors is not None else np.empty((0, 0), dtype=self.dtype)
+
+        tmp_vectors = self._vectors_path() + ".tmp.npy"
+        np.save(tmp_vectors, np.ascontiguousarray(vectors))
+        tmp_docs = self._docs_path() + ".tmp"
+        with open(tmp_docs, "w", encoding="utf-8") as f:
+            json.dump({"texts": self._texts, "metadatas": self._metadatas, "ids": self._ids},
+                      f, ensure_ascii=False)
+
+        # Файл с матрицей мог быть отображён в память, поэтому сначала читаем его в ОЗУ
+        self._vectors = np.array(vectors)
+        os.replace(tmp_vectors, self._vectors_path())
+        os.replace(tmp_docs, self._docs_path())
+
+    def _load(self):
+        """Загружает матрицу (memory-mapped) и документы с диска."""
+        self._vectors = np.load(self._vectors_path(), mmap_mode="r")
+        self.dtype = self._vectors.dtype
+        with open(self._docs_path(), "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        self._texts = docs["texts"]
+        self._metadatas = docs["metadatas"]
+        self._ids = docs["ids"]
+        self._invalidate()
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+
+# =====================
+#  Бенчмарк
+# =====================
+# python numpy_vectorstore.py
+
+if __name__ == "__main__":
+    class _RandomEmbeddings(Embeddings):
+        """Случайные эмбеддинги той же размерности, что у paraphrase-multilingual-MiniLM-L12-v2."""
+        def __init__(self, dim: int = 384):
+            self.dim = dim
+            self.rng = np.random.default_rng(0)
+
+        def embed_documents(self, texts: List[str]) -> List[List[float]]:
+            return self.rng.standard_normal((len(texts), self.dim)).astype(np.float32).tolist()
+
+        def embed_query(self, text: str) -> List[float]:
+            return self.rng.standard_normal(self.dim).astype(np.float32).tolist()
+
+    def _bench(store: NumpyVectorStore, label: str, repeats: int = 200, **kwargs):
+        queries = [store.embeddings.embed_query("") for _ in range(repeats)]
+        start = time.perf_counter()
+        for q in queries:
+            store.similarity_search_by_vector_with_score(q, k=10, **kwargs)
+        elapsed = (time.perf_counter() - start) / repeats * 1000
+        print(f"{label:<40} {elapsed:.3f} мс/запрос")
+
+    embeddings = _RandomEmbeddings()
+    for size in (3000, 30000):
+        texts = [f"Услуга {i}" for i in range(size)]
+        metadatas = [{"category": "услуга" if i % 2 else "время"} for i in range(size)]
+        store = NumpyVectorStore.from_texts(texts, embeddings, metadatas=metadatas)
+        _bench(store, f"N={size}, float32, точный")
+        _bench(store, f"N={size}, float32, точный + фильтр", filter={"category": "услуга"})
+        # float16 - режим экономии памяти, приводится для сравнения
+        store = NumpyVectorStore.from_texts(texts, embeddings, metadatas=metadatas, dtype="float16")
+        _bench(store, f"N={size}, float16 (экономия памяти)")
+        if hnswlib is not None:
+            store = NumpyVectorStore.from_texts(texts, embeddings, metadatas=metadatas,
+                                                use_hnsw=True, hnsw_min_size=0)
+            store.similarity_search_by_vector(embeddings.embed_query(""), k=10)  # построение индекса
+            _bench(store, f"N={size}, float32, HNSW")
@@ -0,0 +1,83 @@
+# single_flight.py
+"""
+Объединение одинаковых одновременных запросов (single-flight).
+
+Если несколько клиентов одновременно задают один и тот же вопрос, поиск и генерация
+выполняются один раз, а результат получают все ожидающие.
+"""
+import asyncio
+import re
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+def normalize_question(question: str) -> str:
+    """Нормализует вопрос для сравнения: нижний регистр и схлопывание пробелов"""
+    return re.sub(r"\s+", " ", question).strip().lower()
+
+
+class _Flight:
+    """Выполняющаяся задача и число клиентов, которые ещё ждут её результат"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Хранит выполняющиеся задачи по ключу. Повторный вызов с тем же ключом,
+    пока задача не завершилась, не запускает новую, а ждёт существующую.
+    Каждый ожидающий ждёт не дольше своего таймаута; задача отменяется,
+    только когда перестали ждать все.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, _Flight] = {}
+        self.calls = 0  # всего вызовов
+        self.shared = 0  # вызовов, получивших чужой результат
+
+    async def run(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args,
+                  timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Выполняет func(*args, **kwargs) или присоединяется к уже выполняющейся задаче с тем же ключом.
+
+        :param key: Ключ объединения (например, нормализованный вопрос, фильтр и класс приоритета).
+        :param func: Асинхронная функция.
+        :param timeout: Сколько секунд этот вызов готов ждать (None - без ограничения).
+                        По истечении выбрасывается asyncio.TimeoutError.
+        :return: Результат func.
+        """
+        self.calls += 1
+        flight = self._in_flight.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(func(*args, **kwargs)))
+            self._in_flight[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.shared += 1
+
+        # Счётчик живёт вместе с задачей: следующий раунд с тем же ключом начинается с нуля
+        flight.waiters += 1
+        try:
+            # shield: уход одного клиента не отменяет задачу для остальных
+            return await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+        except asyncio.CancelledError:
+            if not flight.task.cancelled():
+                raise  # отменён сам ожидающий (клиент отключился)
+            # Общую задачу отменили извне - для ожидающего это тот же отказ, что и таймаут
+            raise asyncio.TimeoutError("Общая задача отменена")
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Ответ больше никому не нужен - отменяем задачу (и её место в очереди).
+                # Ключ освобождается сразу, чтобы новый вызов не присоединился к отменяемой задаче.
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: Hashable, flight: _Flight):
+        # Под ключом может уже выполняться более новая задача - её не трогаем
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
@@ -15,7 +15,7 @@ import whisper  # Теперь импорт происходит после па
 from abstracts import AbstractChatBot
 from llm_module import RealLLM
 import config
-from pydub import AudioSegment
+from voice_processing import VoiceTranscriber
 
 class TelegramChatBot(AbstractChatBot):
     def clear_history(self, message):
@@ -27,7 +27,14 @@ class TelegramChatBot(AbstractChatBot):
     def __init__(self):
         self.bot = telebot.TeleBot(config.TELEGRAM_API_TOKEN)
         self.llm = RealLLM()
-        self.whisper_model = whisper.load_model("base")
+        self.transcriber = VoiceTranscriber(
+            whisper.load_model,
+            small_model=config.WHISPER_SMALL_MODEL,
+            large_model=config.WHISPER_LARGE_MODEL,
+            small_model_max_seconds=config.WHISPER_SMALL_MODEL_MAX_SECONDS,
+            busy_threshold=config.WHISPER_BUSY_THRESHOLD,
+            max_seconds=config.VOICE_MAX_SECONDS
+        )
         self.conversation_history = {}
 
         # Регистрируем обработчики
@@ -46,24 +53,26 @@ class TelegramChatBot(AbstractChatBot):
             file_info = self.bot.get_file(message.voice.file_id)
             downloaded_file = self.bot.download_file(file_info.file_path)
             ogg_path = f"voice_{user_id}.ogg"
-            wav_path = f"voice_{user_id}.wav"
             with open(ogg_path, "wb") as new_file:
                 new_file.write(downloaded_file)
             # Используем Whisper для транскрипции
-            transcript = self.handle_voice(user_id, ogg_path, wav_path)
+            transcript, error = self.handle_voice(user_id, ogg_path)
+            try:
+                os.remove(ogg_path)
+            except Exception as e:
+                print("Ошибка удаления файлов:", e)
+            if error:
+                # Сообщение отклонено (нет речи или слишком длинное) - модель не вызываем
+                self.bot.send_message(user_id, error)
+                return
             # Добавляем в историю сообщение от пользователя (тип voice – уже в виде текста)
             self.conversation_history[user_id].append(("User", transcript))
             # Формируем контекст из 3 предыдущих сообщений, если есть
             context = self.build_context(user_id, transcript)
-            response = self.llm.process(context)
+            response = self.llm.process(context, client_id=f"telegram:{user_id}")
             # Добавляем ответ бота в историю
             self.conversation_history[user_id].append(("Bot", response))
             self.bot.send_message(user_id, f"Транскрипция: {transcript}\nОтвет: {response}")
-            try:
-                os.remove(ogg_path)
-                os.remove(wav_path)
-            except Exception as e:
-                print("Ошибка удаления файлов:", e)
             return
 
         # Обработка текстового сообщения
@@ -84,29 +93,29 @@ class TelegramChatBot(AbstractChatBot):
             self.conversation_history[user_id].append(("User", text))
             # Формируем контекст для LLM: берем 3 последних сообщения из истории перед текущим
             context = self.build_context(user_id, text)
-            response = self.llm.process(context)
+            response = self.llm.process(context, client_id=f"telegram:{user_id}")
             # Добавляем ответ бота в историю
             self.conversation_history[user_id].append(("Bot", response))
             self.bot.send_message(user_id, response)
 
-    def handle_voice(self, user_id: int, ogg_path: str, wav_path: str) -> str:
+    def handle_voice(self, user_id: int, ogg_path: str) -> tuple[str, str | None]:
         """
         Использует Whisper для транскрипции голосового сообщения:
-         - Конвертирует ogg в wav.
-         - Вызывает модель Whisper для получения транскрипта.
+         - Декодирует ogg сразу в массив NumPy и обрезает тишину.
+         - Отклоняет сообщения без речи и слишком длинные.
+         - Выбирает модель Whisper по длительности и нагрузке и получает транскрипт.
+        Возвращает транскрипт и сообщение об отказе (None, если сообщение распознано).
         """
         try:
-            # Конвертируем ogg в wav
             print("Начало обработки аудио")
-            sound = AudioSegment.from_file(ogg_path, format="ogg")
-            sound.export(wav_path, format="wav")
-            # Транскрибируем с помощью Whisper
-            result = self.whisper_model.transcribe(wav_path, language="ru")
-            transcript = result["text"].strip()
+            result = self.transcriber.transcribe_file(ogg_path, format="ogg")
+            if result.error:
+                return "", result.error
+            transcript = result.text
         except Exception as e:
             transcript = "Не удалось распознать голосовое сообщение."
             print("Ошибка распознавания:", e)
-        return transcript
+        return transcript, None
 
     def build_context(self, user_id: int, current_message: str) -> str:
         """
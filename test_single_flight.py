@@ -0,0 +1,104 @@
+# test_single_flight.py
+"""
+Тесты объединения одинаковых одновременных запросов (single_flight.py).
+
+Запуск: python -m pytest -q
+"""
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+async def _answer(value, delay: float = 0.05):
+    await asyncio.sleep(delay)
+    return value
+
+
+class _Counter:
+    """Асинхронная функция, считающая свои запуски"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, value, delay: float = 0.05):
+        self.calls += 1
+        return await _answer(value, delay)
+
+
+def test_shared_result():
+    """Одновременные одинаковые вопросы выполняются один раз, ответ получают все"""
+    async def scenario():
+        flight = SingleFlight()
+        func = _Counter()
+        answers = await asyncio.gather(*(flight.run("k", func, "a") for _ in range(3)))
+        assert answers == ["a", "a", "a"]
+        assert func.calls == 1
+        assert flight.shared == 2
+        assert len(flight) == 0
+
+    asyncio.run(scenario())
+
+
+def test_timeout_does_not_cancel_other_waiter():
+    """Таймаут одного клиента не отменяет задачу для другого, который ещё ждёт"""
+    async def scenario():
+        flight = SingleFlight()
+        func = _Counter()
+        patient = asyncio.ensure_future(flight.run("k", func, "a", 0.2))
+        impatient = asyncio.ensure_future(flight.run("k", func, "a", 0.2, timeout=0.01))
+        with pytest.raises(asyncio.TimeoutError):
+            await impatient
+        assert await patient == "a"
+        assert func.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_key_reused_after_completion():
+    """После завершения задачи тот же ключ запускает новую"""
+    async def scenario():
+        flight = SingleFlight()
+        func = _Counter()
+        assert await flight.run("k", func, "a") == "a"
+        assert len(flight) == 0
+        assert await flight.run("k", func, "b") == "b"
+        assert func.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_all_waiters_gone_cancels_task():
+    """Когда ушли все клиенты, задача отменяется, а новый вызов запускает свежую"""
+    async def scenario():
+        flight = SingleFlight()
+        func = _Counter()
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.run("k", func, "a", 0.2, timeout=0.01)
+        assert len(flight) == 0
+        assert await flight.run("k", func, "b") == "b"
+        assert func.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_key_reused_after_timeout_round():
+    """Второй раунд с тем же ключом: ушедший по таймауту клиент не отменяет ответ терпеливому"""
+    async def scenario():
+        flight = SingleFlight()
+
+        # Первый раунд: два клиента получают один ответ
+        first = await asyncio.gather(flight.run("k", _answer, "a1"), flight.run("k", _answer, "a1"))
+        assert first == ["a1", "a1"]
+        assert len(flight) == 0
+
+        # Второй раунд: один клиент ждёт недолго, второй - без ограничения
+        impatient = asyncio.ensure_future(flight.run("k", _answer, "a2", 0.2, timeout=0.01))
+        patient = asyncio.ensure_future(flight.run("k", _answer, "a2", 0.2))
+        with pytest.raises(asyncio.TimeoutError):
+            await impatient
+        assert await patient == "a2"
+        assert len(flight) == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,177 @@
+# voice_processing.py
+"""
+Предобработка голосовых сообщений перед Whisper.
+
+Аудио декодируется сразу в массив NumPy (16 кГц, моно), тишина в начале и в конце
+обрезается энергетическим детектором речи (VAD), слишком длинные сообщения
+отклоняются. Размер модели выбирается
+по длительности сообщения и текущей нагрузке, для каждого сообщения считается
+коэффициент реального времени (RTF = время обработки / длительность аудио).
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from pydub import AudioSegment
+
+SAMPLE_RATE = 16000  # Whisper работает с 16 кГц
+
+
+@dataclass
+class TranscriptionResult:
+    text: str
+    duration: float  # длительность исходного сообщения, с
+    speech_duration: float  # длительность после обрезки тишины, с
+    model: Optional[str] = None
+    elapsed: float = 0.0  # время обработки, с
+    error: Optional[str] = None  # причина отказа (сообщение для пользователя)
+
+    @property
+    def rtf(self) -> float:
+        """Коэффициент реального времени: < 1 - быстрее реального времени"""
+        return self.elapsed / self.duration if self.duration > 0 else 0.0
+
+
+def decode_audio(path: str, format: Optional[str] = None) -> np.ndarray:
+    """
+    Декодирует аудиофайл в float32-массив (16 кГц, моно, значения в [-1, 1])
+    без промежуточного wav-файла.
+    """
+    sound = AudioSegment.from_file(path, format=format)
+    sound = sound.set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2)
+    samples = np.array(sound.get_array_of_samples(), dtype=np.int16)
+    return samples.astype(np.float32) / 32768.0
+
+
+def trim_silence(audio: np.ndarray,
+                 frame_ms: int = 30,
+                 min_db: float = -50.0,
+                 margin_db: float = 10.0,
+                 padding_ms: int = 200) -> np.ndarray:
+    """
+    Обрезает тишину в начале и в конце записи по энергии кадров.
+
+    Кадр считается речью, если его уровень выше max(min_db, min(шумовой фон + margin_db,
+    пиковый уровень - margin_db)), где шумовой фон - 10-й перцентиль уровней кадров.
+    Ограничение сверху пиковым уровнем нужно для записей почти без пауз: там перцентиль
+    попадает на речь, и без него вся запись была бы отброшена как тишина.
+
+    :param audio: Аудио, float32, 16 кГц.
+    :param frame_ms: Длина кадра, мс.
+    :param min_db: Абсолютный порог уровня речи, дБ относительно полной шкалы.
+    :param margin_db: Превышение над шумовым фоном, дБ.
+    :param padding_ms: Запас, оставляемый вокруг речи, мс.
+    :return: Обрезанное аудио (пустой массив, если речи нет).
+    """
+    frame = SAMPLE_RATE * frame_ms // 1000
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return audio
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    levels = 20 * np.log10(np.maximum(rms, 1e-10))
+    threshold = max(min_db, min(np.percentile(levels, 10) + margin_db, levels.max() - margin_db))
+
+    speech = np.flatnonzero(levels > threshold)
+    if len(speech) == 0:
+        return audio[:0]
+
+    padding = SAMPLE_RATE * padding_ms // 1000
+    start = max(0, speech[0] * frame - padding)
+    end = min(len(audio), (speech[-1] + 1) * frame + padding)
+    return audio[start:end]
+
+
+class VoiceTranscriber:
+    """
+    Распознавание голосовых сообщений с выбором модели Whisper.
+
+    Короткие сообщения и сообщения, пришедшие под нагрузкой, распознаются маленькой
+    моделью, остальные - основной.
+    """
+
+    def __init__(self,
+                 load_model: Callable[[str], object],
+                 small_model: str = "tiny",
+                 large_model: str = "base",
+                 small_model_max_seconds: float = 10.0,
+                 busy_threshold: int = 2,
+                 max_seconds: float = 120.0,
+                 language: str = "ru"):
+        """
+        :param load_model: Функция загрузки модели Whisper по имени (whisper.load_model).
+        :param small_model: Быстрая модель для коротких сообщений и работы под нагрузкой.
+        :param large_model: Основная модель.
+        :param small_model_max_seconds: Сообщения не длиннее этого распознаются быстрой моделью.
+        :param busy_threshold: Число одновременных распознаваний (включая текущее),
+                               начиная с которого используется быстрая модель.
+        :param max_seconds: Сообщения длиннее (после обрезки тишины) отклоняются.
+        :param language: Язык распознавания.
+        """
+        self.small_model = small_model
+        self.large_model = large_model
+        self.small_model_max_seconds = small_model_max_seconds
+        self.busy_threshold = busy_threshold
+        self.max_seconds = max_seconds
+        self.language = language
+
+        # Обе модели загружаются заранее, чтобы первое сообщение не ждало загрузки
+        self.models: Dict[str, object] = {name: load_model(name) for name in {small_model, large_model}}
+
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def select_model(self, duration: float, active: int) -> str:
+        """Выбирает модель по длительности речи и числу одновременных распознаваний (включая текущее)"""
+        if duration <= self.small_model_max_seconds or active >= self.busy_threshold:
+            return self.small_model
+        return self.large_model
+
+    def transcribe_file(self, path: str, format: Optional[str] = None) -> TranscriptionResult:
+        """Декодирует файл и распознаёт его"""
+        start = time.perf_counter()
+        audio = decode_audio(path, format=format)
+        result = self.transcribe(audio)
+        result.elapsed = time.perf_counter() - start  # с учётом декодирования
+        return result
+
+    def transcribe(self, audio: np.ndarray) -> TranscriptionResult:
+        """
+        Обрезает тишину, проверяет длительность и распознаёт аудио.
+
+        :param audio: Аудио, float32, 16 кГц.
+        :return: Результат распознавания (с error, если сообщение отклонено).
+        """
+        start = time.perf_counter()
+        duration = len(audio) / SAMPLE_RATE
+        speech = trim_silence(audio)
+        speech_duration = len(speech) / SAMPLE_RATE
+
+        if speech_duration == 0:
+            return TranscriptionResult("", duration, 0.0, elapsed=time.perf_counter() - start,
+                                       error="В голосовом сообщении не найдено речи.")
+        if speech_duration > self.max_seconds:
+            return TranscriptionResult("", duration, speech_duration, elapsed=time.perf_counter() - start,
+                                       error=f"Голосовое сообщение слишком длинное "
+                                             f"(больше {int(self.max_seconds)} сек.), "
+                                             f"пожалуйста, разбейте его на несколько.")
+
+        with self._lock:
+            self._active += 1
+            active = self._active
+        try:
+            model_name = self.select_model(speech_duration, active)
+            # Длинное аудио Whisper сам обрабатывает окнами по 30 с с учётом предыдущего текста
+            text = self.models[model_name].transcribe(speech, language=self.language)["text"].strip()
+        finally:
+            with self._lock:
+                self._active -= 1
+
+        result = TranscriptionResult(text, duration, speech_duration,
+                                     model=model_name, elapsed=time.perf_counter() - start)
+        print(f"Голосовое сообщение: {duration:.1f} с (речь {speech_duration:.1f} с), "
+              f"модель {model_name}, {result.elapsed:.2f} с, RTF {result.rtf:.2f}")
+        return result
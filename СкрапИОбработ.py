@@ -1,13 +1,15 @@
 import json
+import sys
 from io import BytesIO
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Iterable, Iterator, Tuple
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 
+import numpy as np
 import pdfplumber
 
 
-@dataclass
+@dataclass(slots=True)
 class WorkTimeInfo:
     _days: str  # День недели -> время приема
     _hours: str
@@ -18,7 +20,7 @@ class WorkTimeInfo:
 
     @property
     def hours(self) -> str:
-        return self.hours
+        return self._hours
 
     def to_dict(self) -> dict:
         return {
@@ -29,7 +31,7 @@ class WorkTimeInfo:
         return f"{self._days} : {self._hours}"
 
 
-@dataclass
+@dataclass(slots=True)
 class ServiceInfo:
     _article: int
     _code: str
@@ -79,6 +81,220 @@ class ReadyEntries:
     metadata: List[Dict]
 
 
+class ServiceTags:
+    """
+    Фиксированная схема категорий услуг.
+
+    Бит i маски соответствует i-й категории из medical_service_categories.json,
+    последний бит - категории "другое". В метаданных векторного хранилища категории
+    записываются целой маской ("tags_mask") и булевыми полями "tag_<категория>",
+    по которым Chroma и NumpyVectorStore умеют фильтровать без разбора строк.
+    """
+
+    OTHER = "другое"
+    MASK_FIELD = "tags_mask"
+    FIELD_PREFIX = "tag_"
+
+    def __init__(self, tag_names: List[str]):
+        self.tag_names = list(tag_names)
+        self._bits = {name: bit for bit, name in enumerate(self.tag_names)}
+
+    @classmethod
+    def from_config(cls, categories_config: str = 'medical_service_categories.json') -> "ServiceTags":
+        """Строит схему по конфигу категорий (без конфига - только категория "другое")"""
+        try:
+            with open(categories_config, 'r', encoding='utf-8') as f:
+                categories = json.load(f)['medical_service_categories']
+        except Exception as e:
+            print(f"Ошибка загрузки конфига категорий: {e}")
+            categories = {}
+        return cls(list(categories) + [cls.OTHER])
+
+    def mask(self, tag_names: List[str]) -> int:
+        """Возвращает битовую маску для списка названий категорий"""
+        mask = 0
+        for name in tag_names:
+            if name not in self._bits:
+                raise ValueError(f"Неизвестная категория услуги: {name}")
+            mask |= 1 << self._bits[name]
+        return mask
+
+    def names(self, mask: int) -> List[str]:
+        """Возвращает список названий категорий по битовой маске"""
+        return [name for bit, name in enumerate(self.tag_names) if mask >> bit & 1]
+
+    def field(self, tag_name: str) -> str:
+        """Имя булева поля метаданных для категории"""
+        return self.FIELD_PREFIX + tag_name
+
+    def metadata(self, mask: int) -> Dict:
+        """Метаданные категорий для записи в векторное хранилище"""
+        metadata = {self.MASK_FIELD: int(mask)}
+        for name in self.names(mask):
+            metadata[self.field(name)] = True
+        return metadata
+
+    def where(self, any_tags: Optional[List[str]] = None,
+              all_tags: Optional[List[str]] = None) -> Optional[Dict]:
+        """
+        Строит фильтр по категориям в формате Chroma (поддерживается и NumpyVectorStore).
+
+        :param any_tags: Запись должна иметь хотя бы одну из категорий (OR).
+        :param all_tags: Запись должна иметь все перечисленные категории (AND).
+        :return: Словарь фильтра или None, если условий нет.
+        """
+        self.mask((any_tags or []) + (all_tags or []))  # проверка названий категорий
+
+        clauses = [{self.field(name): True} for name in all_tags or []]
+        if any_tags:
+            any_clauses = [{self.field(name): True} for name in any_tags]
+            clauses.append(any_clauses[0] if len(any_clauses) == 1 else {"$or": any_clauses})
+
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class StringColumn:
+    """
+    Столбец строк: все строки в одном буфере UTF-8 и массив смещений (как строковые столбцы Arrow).
+
+    Запись занимает длину строки в байтах и 4 байта смещения вместо отдельного
+    объекта str (заголовок ~75 байт и 2 байта на кириллический символ).
+    """
+
+    def __init__(self, data: bytes, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings: Iterable[str]) -> "StringColumn":
+        encoded = [str(string).encode('utf-8') for string in strings]
+        data = b"".join(encoded)
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint32 if len(data) < 2 ** 32 else np.int64)
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+        return cls(data, offsets)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + self.offsets.nbytes
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        """Строка по номеру или новый столбец по массиву индексов / булевой маске"""
+        if isinstance(i, (int, np.integer)):
+            if i < 0:
+                i += len(self)
+            return self.data[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+        return StringColumn.from_strings(self[int(j)] for j in np.arange(len(self))[i])
+
+
+class ServiceCatalogue:
+    """
+    Колоночное хранилище перечня услуг.
+
+    Вместо списка объектов ServiceInfo каждое поле хранится отдельным массивом:
+    артикул - int64, код и название - StringColumn, цена - float64,
+    категории - битовая маска uint64 по схеме ServiceTags.
+    Фильтрация по цене и категориям выполняется векторно.
+    """
+
+    def __init__(self, articles: np.ndarray, codes: StringColumn, names: StringColumn,
+                 prices: np.ndarray, tags: np.ndarray, schema: ServiceTags):
+        self.articles = articles
+        self.codes = codes
+        self.names = names
+        self.prices = prices
+        self.tags = tags
+        self.schema = schema
+
+    @property
+    def tag_names(self) -> List[str]:
+        return self.schema.tag_names
+
+    @classmethod
+    def from_services(cls, services: List[ServiceInfo], tags: List[int],
+                      schema: ServiceTags) -> "ServiceCatalogue":
+        """
+        Строит каталог из списка услуг.
+
+        :param services: Список услуг (результат ClinicScraper.scrape_services).
+        :param tags: Битовая маска категорий для каждой услуги.
+        :param schema: Схема категорий.
+        """
+        n = len(services)
+        articles = np.fromiter((service.article for service in services), dtype=np.int64, count=n)
+        codes = StringColumn.from_strings(service.code for service in services)
+        names = StringColumn.from_strings(service.name for service in services)
+        prices = np.fromiter((service.price for service in services), dtype=np.float64, count=n)
+        return cls(articles, codes, names, prices,
+                   np.asarray(tags, dtype=np.uint64), schema)
+
+    @property
+    def nbytes(self) -> int:
+        """Объём данных каталога в байтах"""
+        return (self.articles.nbytes + self.codes.nbytes + self.names.nbytes
+                + self.prices.nbytes + self.tags.nbytes)
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def __getitem__(self, i: int) -> ServiceInfo:
+        return ServiceInfo(int(self.articles[i]), self.codes[i], self.names[i], float(self.prices[i]))
+
+    def __iter__(self) -> Iterator[ServiceInfo]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def tag_mask(self, tag_names: List[str]) -> int:
+        """Возвращает битовую маску для списка названий категорий."""
+        return self.schema.mask(tag_names)
+
+    def tags_of(self, i: int) -> List[str]:
+        """Возвращает список названий категорий услуги."""
+        return self.schema.names(int(self.tags[i]))
+
+    def select(self, min_price: Optional[float] = None, max_price: Optional[float] = None,
+               any_tags: Optional[List[str]] = None,
+               all_tags: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Возвращает индексы услуг, подходящих под условия.
+
+        :param min_price: Минимальная цена (включительно).
+        :param max_price: Максимальная цена (включительно).
+        :param any_tags: Услуга должна иметь хотя бы одну из категорий.
+        :param all_tags: Услуга должна иметь все перечисленные категории.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if min_price is not None:
+            mask &= self.prices >= min_price
+        if max_price is not None:
+            mask &= self.prices <= max_price
+        if any_tags:
+            mask &= (self.tags & np.uint64(self.tag_mask(any_tags))) != 0
+        if all_tags:
+            required = np.uint64(self.tag_mask(all_tags))
+            mask &= (self.tags & required) == required
+        return np.flatnonzero(mask)
+
+    def filter(self, **conditions) -> "ServiceCatalogue":
+        """Возвращает новый каталог из услуг, подходящих под условия select()."""
+        idx = self.select(**conditions)
+        return ServiceCatalogue(self.articles[idx], self.codes[idx], self.names[idx],
+                                self.prices[idx], self.tags[idx], self.schema)
+
+    def iter_entries(self) -> Iterator[Tuple[str, Dict]]:
+        """
+        Построчно отдаёт пары (текст, метаданные) для загрузки в векторное хранилище,
+        не создавая промежуточных списков и объектов ServiceInfo.
+        """
+        for i in range(len(self)):
+            yield (f"{self.names[i]} Цена: {self.prices[i]} рублей",
+                   {"category": "услуга", **self.schema.metadata(int(self.tags[i]))})
+
+
 class AbstractDataProcessor(ABC):
     @abstractmethod
     def process_raw_data(self, raw_data: List) -> ReadyEntries:
@@ -244,7 +460,11 @@ class ClinicScraper(AbstractClinicScraper):
             price = float(price_str)
         except (ValueError, AttributeError):
             price = 0.0
-        processed = ServiceInfo(raw_data[0], raw_data[1], raw_data[2], price)
+        try:
+            article = int(str(raw_data[0]).strip())
+        except ValueError:
+            article = 0
+        processed = ServiceInfo(article, raw_data[1], raw_data[2], price)
 
         return processed
 
@@ -268,8 +488,22 @@ class MedicalDataProcessor(AbstractDataProcessor):
 
         return ReadyEntries(texts=texts, metadata=metadata)
 
-    def _categorize_services(self, services: List[ServiceInfo]) -> [str, Dict]:
-        """Категоризация медицинских услуг (возвращает все подходящие категории)"""
+    def build_catalogue(self, raw_data: List[ServiceInfo]) -> ServiceCatalogue:
+        """Построение колоночного каталога услуг с битовыми масками категорий"""
+        categories = self._load_categories()
+        schema = self._tag_schema(categories)
+        tags = [schema.mask(self._match_categories(service.name, categories))
+                for service in raw_data]
+
+        return ServiceCatalogue.from_services(raw_data, tags, schema)
+
+    @staticmethod
+    def _tag_schema(categories: Dict[str, List[str]]) -> ServiceTags:
+        """Схема битов категорий в порядке конфига"""
+        return ServiceTags(list(categories) + [ServiceTags.OTHER])
+
+    def _load_categories(self) -> Dict[str, List[str]]:
+        """Загрузка конфига категорий: категория -> список ключевых слов"""
         try:
             with open(self.categories_config, 'r', encoding='utf-8') as f:
                 categories = json.load(f)['medical_service_categories']
@@ -277,24 +511,32 @@ class MedicalDataProcessor(AbstractDataProcessor):
             print(f"Ошибка загрузки конфига категорий: {e}")
             categories = {}
 
-        result = []
-        for service in services:
-            service_name = service.name.lower()
-            categories_list = []  # Здесь будут все подходящие категории
+        return {cat: [kw.lower() for kw in keywords.split(", ")]
+                for cat, keywords in categories.items()}
+
+    @staticmethod
+    def _match_categories(service_name: str, categories: Dict[str, List[str]]) -> List[str]:
+        """Возвращает все подходящие категории услуги (или ["другое"])"""
+        service_name = service_name.lower()
+        categories_list = [cat for cat, keywords in categories.items()
+                           if any(kw in service_name for kw in keywords)]
+
+        # Если ни одна категория не подошла, ставим "другое"
+        return categories_list or [ServiceTags.OTHER]
 
-            # Проверяем все категории
-            for cat, keywords in categories.items():
-                if any(kw.lower() in service_name for kw in keywords.split(", ")):
-                    categories_list.append(cat)  # Добавляем все подходящие категории
+    def _categorize_services(self, services: List[ServiceInfo]) -> [str, Dict]:
+        """Категоризация медицинских услуг (возвращает все подходящие категории)"""
+        categories = self._load_categories()
+        schema = self._tag_schema(categories)
 
-            # Если ни одна категория не подошла, ставим "другое"
-            if not categories_list:
-                categories_list = ["другое"]
+        result = []
+        for service in services:
+            categories_list = self._match_categories(service.name, categories)
 
-            # Формируем словарь с категориями
+            # Формируем словарь с категориями: битовая маска и булевы поля tag_<категория>
             cats = {
-                "tags": categories_list,  # Теперь это список, а не строка
-                "category": "услуга"
+                "category": "услуга",
+                **schema.metadata(schema.mask(categories_list))
             }
 
             result.append((service.to_str(), cats))
@@ -313,4 +555,23 @@ for text, metadata in zip(ready_entries.texts, ready_entries.metadata):
 
 
 
-"""
\ No newline at end of file
+"""
+
+
+if __name__ == "__main__":
+    # Память на одну услугу: список ServiceInfo против ServiceCatalogue (синтетический прейскурант)
+    def _list_size(services: List[ServiceInfo]) -> int:
+        return sys.getsizeof(services) + sum(
+            sys.getsizeof(service) + sum(sys.getsizeof(value) for value in
+                                         (service.article, service.code, service.name, service.price))
+            for service in services)
+
+    schema = ServiceTags(["терапия", "диагностика", ServiceTags.OTHER])
+    for size in (3000, 30000):
+        services = [ServiceInfo(i, f"B01.{i % 1000:03d}.{i:06d}",
+                                f"Приём (осмотр, консультация) врача-специалиста, услуга номер {i}",
+                                float(100 + i % 5000))
+                    for i in range(size)]
+        catalogue = ServiceCatalogue.from_services(services, [1 << (i % 3) for i in range(size)], schema)
+        print(f"N={size}: список ServiceInfo {_list_size(services) / size:.0f} байт/услуга, "
+              f"ServiceCatalogue {catalogue.nbytes / size:.0f} байт/услуга")